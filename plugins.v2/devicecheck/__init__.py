@@ -2,17 +2,237 @@
 设备状态检测插件
 检测设备在线状态并发送事件通知给其他插件
 """
+import asyncio
+import os
+from array import array
+import shutil
+import socket
+import struct
+import sys
 import threading
 import subprocess
-import socket
-from time import sleep, time
-from typing import Any, Dict, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, time
+from typing import Any, Dict, List, NamedTuple, Tuple, Optional
 
 from app.core.event import eventmanager, Event
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import EventType
 
+_IS_WINDOWS = os.name == 'nt'
+_IS_MACOS = sys.platform == 'darwin'
+# ICMP回显请求/应答类型
+_ICMP_ECHO_REQUEST = 8
+_ICMP_ECHO_REPLY = 0
+_ICMP_PAYLOAD = b"MoviePilot-DeviceCheck"
+# 离线设备退避：检测间隔最多放大到32倍，且不超过5分钟（检测间隔本身更长时以检测间隔为准）
+_MAX_BACKOFF_FACTOR = 32
+_MAX_BACKOFF_SECONDS = 300
+# 主机名解析结果缓存时间（秒）
+_RESOLVE_TTL = 3600
+# 主机名解析线程池的最大线程数，线程按需创建
+_RESOLVE_WORKERS = 32
+# 同时进行中的端口连接数上限，避免设备很多时耗尽文件描述符
+_MAX_CONNECTS = 256
+# 新状态需连续检测到的次数，达到后才确认并发送事件（含初始状态）
+_CONFIRM_SAMPLES = 2
+# 汇总事件最多等待的检测轮数，超过后仍未确认的设备按最近一次检测结果发送
+_INITIAL_MAX_ROUNDS = 4
+# 设备状态编码，状态缓存中按编码存储，发送事件和记录日志时转换为状态名称
+_UNKNOWN, _ONLINE, _OFFLINE = 0, 1, 2
+_STATUS_NAMES = (None, "online", "offline")
+# 按设备下标存储的状态字段，每个字段为一个数组 (属性名, 数组类型码, 初始值)
+_STATE_FIELDS = (
+    ("_status", "B", _UNKNOWN),
+    ("_pending", "B", _UNKNOWN),
+    ("_pending_count", "I", 0),
+    ("_fail_count", "B", 0),
+    ("_next_check", "d", 0.0),
+)
+
+
+def _icmp_checksum(data: bytes) -> int:
+    """
+    计算ICMP校验和
+    """
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+class _Device(NamedTuple):
+    """
+    解析后的设备配置，key 在解析时生成，用于跨配置变更保留设备状态；
+    literal 表示 ip 是IP地址而非主机名，检测时无需解析；
+    event 为预先生成的事件数据模板，发送事件时复制后填入状态和时间
+    """
+    name: str
+    ip: str
+    port: Optional[int]
+    key: str
+    literal: bool
+    event: Dict[str, Any]
+
+
+# 插件配置页面的表单结构，内容固定，get_form 直接返回，调用方不应修改
+_FORM_SPEC: List[dict] = [
+    {
+        'component': 'VForm',
+        'content': [
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 6
+                        },
+                        'content': [
+                            {
+                                'component': 'VSwitch',
+                                'props': {
+                                    'model': 'enabled',
+                                    'label': '启用插件',
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 6
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'check_interval',
+                                    'label': '检测间隔（秒）',
+                                    'type': 'number',
+                                    'placeholder': '30'
+                                }
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 6
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextField',
+                                'props': {
+                                    'model': 'timeout',
+                                    'label': '超时时间（秒）',
+                                    'type': 'number',
+                                    'placeholder': '3'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextarea',
+                                'props': {
+                                    'model': 'devices',
+                                    'label': '设备列表',
+                                    'placeholder': '蓝光机#192.168.1.88#\n芝杜SMB服务#192.168.1.89#445\nNFS服务器#192.168.1.90#2049',
+                                    'rows': 5,
+                                    'hint': '格式：设备名称#IP地址#端口（端口可选，留空则使用Ping检测）。每行一个设备。',
+                                    'persistent-hint': True
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                        },
+                        'content': [
+                            {
+                                'component': 'VAlert',
+                                'props': {
+                                    'type': 'info',
+                                    'variant': 'tonal',
+                                    'style': 'white-space: pre-line; font-size: 13px',
+                                    'text': '配置示例:\n\n'
+                                            '• 播放器#192.168.1.88#\n'
+                                            '   设备名称：播放器，IP：192.168.1.88，端口留空，使用Ping检测\n'
+                                            '• NAS#192.168.1.89#445\n'
+                                            '   设备名称：NAS，IP：192.168.1.89，端口：445（SMB），使用端口检测\n\n'
+                                            '常用端口提示：SMB (445) | NFS (2049) | CD2 (19798) | 留空则使用Ping检测'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'props': {
+                    'style': {
+                        'margin-top': '12px'
+                    },
+                },
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12
+                        },
+                        'content': [
+                            {
+                                'component': 'VAlert',
+                                'props': {
+                                    'type': 'info',
+                                    'variant': 'tonal',
+                                    'style': 'white-space: pre-line; font-size: 13px',
+                                    'text': '如何接收设备状态事件:\n\n'
+                                            '其他插件可以通过监听 PluginTriggered 事件来接收设备状态变化通知。\n'
+                                            '事件字段：device_name（设备名）、device_ip（IP地址）、device_port（端口）、status（online/offline）、timestamp（时间戳）。\n'
+                                            '设备状态需连续两次检测结果一致才会发送事件。\n'
+                                            '插件启动后不单独发送各设备的初始状态，所有设备的初始状态确认后发送一次 event_name 为 devices_initialized 的汇总事件，'
+                                            'devices 字段为各设备的 device_name、device_ip、device_port、status 列表。'
+                                            '4 轮检测后仍有设备未确认时，这些设备按最近一次检测结果发送，确认后再单独发送状态事件。\n'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            }
+        ]
+    }
+]
+
 
 class DeviceCheck(_PluginBase):
     # 插件名称
@@ -22,7 +242,7 @@ class DeviceCheck(_PluginBase):
     # 插件图标
     plugin_icon = "Syncthing.png"
     # 插件版本
-    plugin_version = "1.0"
+    plugin_version = "1.2"
     # 插件作者
     plugin_author = "narapeka"
     # 作者主页
@@ -36,18 +256,50 @@ class DeviceCheck(_PluginBase):
 
     # 私有属性
     _enabled = False
-    _devices = []  # 设备列表: [{"name": "设备名", "ip": "IP地址", "port": 端口（可选）}]
+    _devices: List[_Device] = []  # 设备列表
     _check_interval = 30  # 检测间隔（秒）
     _timeout = 3  # 超时时间（秒）
     
     # 监控线程
     _monitor_thread: Optional[threading.Thread] = None
-    # 停止事件
-    _stop_event = threading.Event()
-    # 设备状态缓存
-    _device_status = {}  # {device_key: {"status": "online/offline", "last_check": timestamp}}
+    # 监控线程中的事件循环及监控任务，停止插件时取消监控任务
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _monitor_task: Optional[asyncio.Task] = None
+    # 系统是否支持非特权ICMP套接字（None表示尚未探测）
+    _icmp_available: Optional[bool] = None
+    # ICMP回显请求标识符及序号
+    _icmp_ident = 0
+    _icmp_seq = 0
+    # 所有ping检测共用的ICMP套接字及等待应答的检测 {序号: (目标地址, Future)}，仅由监控线程读写
+    # 等待应答的检测、fping批次任务及保持的连接在监控任务启动时创建
+    _icmp_sock: Optional[socket.socket] = None
+    _icmp_waiters: Dict[int, Tuple[str, asyncio.Future]] = {}
+    # ping命令参数模板（不含目标地址）
+    _ping_command: List[str] = []
+    # fping命令参数模板（不含目标地址），系统未安装fping时为None
+    _fping_command: Optional[List[str]] = None
+    # 正在收集目标地址、尚未启动的fping批次 ({目标地址: Future}, 批次任务)，以及所有未完成的批次任务
+    _fping_batch: Optional[Tuple[Dict[str, asyncio.Future], asyncio.Task]] = None
+    _fping_tasks: set = set()
+    # 设备状态缓存，与 _status_devices 按下标一一对应，仅由监控线程读写
+    _status_devices: List[_Device] = []
+    _status = array("B")  # 已确认的状态 _ONLINE / _OFFLINE，_UNKNOWN 表示尚未确认
+    _pending = array("B")  # 与已确认状态不同、等待确认的新状态
+    _pending_count = array("I")  # 新状态已连续检测到的次数
+    _fail_count = array("B")  # 连续离线次数，最多记到255
+    _next_check = array("d")  # 下次检测的单调时钟时间，离线设备按连续离线次数退避
+    # 是否已发送所有设备初始状态的汇总事件，设备初始状态不再单独发送事件
+    _initialized = False
+    # 发送汇总事件前已进行的检测轮数
+    _initial_rounds = 0
+    # 限制同时进行中的端口连接数
+    _connect_limit: Optional[asyncio.Semaphore] = None
+    # 端口检测保持的TCP连接 {device_key: socket}，仅由监控线程读写
+    _sockets: Dict[str, socket.socket] = {}
+    # 主机名解析缓存 {host: (IPv4地址, 过期的单调时钟时间)}，仅由监控线程读写
+    _addresses: Dict[str, Tuple[str, float]] = {}
 
-    def _parse_devices(self, devices_text: str) -> List[Dict[str, Any]]:
+    def _parse_devices(self, devices_text: str) -> List[_Device]:
         """
         解析文本格式的设备配置
         格式: name#ip#port (每行一条，port可选)
@@ -70,17 +322,33 @@ class DeviceCheck(_PluginBase):
                 port_str = parts[2].strip() if len(parts) > 2 else None
                 
                 if name and ip:
-                    device = {
-                        "name": name,
-                        "ip": ip
-                    }
-                    # 只有当端口字符串非空时才解析端口
+                    port = None
+                    # 只有当端口字符串非空时才解析端口，无效端口在此丢弃，检测时无需再校验
                     if port_str:
                         try:
-                            device["port"] = int(port_str)
+                            port = int(port_str)
                         except (ValueError, TypeError):
                             logger.warning(f"设备配置：端口格式错误，忽略端口 '{port_str}'")
-                    devices.append(device)
+                        else:
+                            if not 0 < port < 65536:
+                                logger.warning(f"设备配置：端口超出范围，忽略端口 '{port_str}'")
+                                port = None
+                    devices.append(_Device(
+                        name=name,
+                        ip=ip,
+                        port=port,
+                        key=sys.intern(f"{ip}:{port or ''}"),
+                        literal=self._is_ip_address(ip),
+                        event={
+                            "plugin_id": self.__class__.__name__,
+                            "event_name": None,
+                            "device_name": name,
+                            "device_ip": ip,
+                            "device_port": port,
+                            "status": None,
+                            "timestamp": 0.0
+                        }
+                    ))
                 else:
                     logger.warning(f"设备配置：跳过无效行（名称或IP为空）: {line}")
             else:
@@ -88,12 +356,23 @@ class DeviceCheck(_PluginBase):
         
         return devices
     
+    @staticmethod
+    def _is_ip_address(host: str) -> bool:
+        """
+        判断是否为IPv4或IPv6地址
+        """
+        for family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                socket.inet_pton(family, host)
+                return True
+            except OSError:
+                pass
+        return False
+
     def init_plugin(self, config: dict = None):
         """
         初始化插件
         """
-        self._stop_event.clear()
-        
         if config:
             self._enabled = config.get("enabled", False)
             devices_text = config.get("devices", "")
@@ -106,6 +385,23 @@ class DeviceCheck(_PluginBase):
                 self._timeout = int(config.get("timeout", 3))
             except (ValueError, TypeError):
                 self._timeout = 3
+            # 设备之间不再逐个等待，检测间隔和超时时间至少为1秒，避免检测循环空转
+            self._check_interval = max(1, self._check_interval)
+            self._timeout = max(1, self._timeout)
+            # 预先生成ping命令参数，避免每次检测重复拼装
+            if _IS_WINDOWS:
+                # Windows: -n 次数，-w 等待应答超时（毫秒）
+                self._ping_command = ['ping', '-n', '1', '-w', str(self._timeout * 1000)]
+            elif _IS_MACOS:
+                # macOS: -c 次数，-t 整体超时（秒）
+                self._ping_command = ['ping', '-c', '1', '-t', str(self._timeout)]
+            else:
+                # Linux/BusyBox: -c 次数，-W 等待应答超时（秒）
+                self._ping_command = ['ping', '-c', '1', '-W', str(self._timeout)]
+            # 安装了fping时，同一时刻需要调用ping命令的设备合并为一次fping调用
+            # fping 的等待应答超时取本轮超时的一半，留出启动进程和逐个发送的时间，保证在本轮结束前退出
+            fping = shutil.which('fping')
+            self._fping_command = [fping, '-a', '-q', '-r', '0', '-t', str(self._timeout * 500)] if fping else None
             
             # 解析设备配置文本
             self._devices = self._parse_devices(devices_text)
@@ -115,8 +411,12 @@ class DeviceCheck(_PluginBase):
                 if self._monitor_thread and self._monitor_thread.is_alive():
                     logger.warning("设备监控线程已在运行")
                 else:
+                    # 监控任务在启动线程前创建，停止插件时总能取消
+                    self._loop = asyncio.new_event_loop()
+                    self._monitor_task = self._loop.create_task(self._monitor_async())
                     self._monitor_thread = threading.Thread(
                         target=self._monitor_devices,
+                        args=(self._loop, self._monitor_task),
                         daemon=True
                     )
                     self._monitor_thread.start()
@@ -155,155 +455,7 @@ class DeviceCheck(_PluginBase):
         if not isinstance(devices_text, str):
             devices_text = ""
         
-        return [
-            {
-                'component': 'VForm',
-                'content': [
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 6
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VSwitch',
-                                        'props': {
-                                            'model': 'enabled',
-                                            'label': '启用插件',
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 6
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VTextField',
-                                        'props': {
-                                            'model': 'check_interval',
-                                            'label': '检测间隔（秒）',
-                                            'type': 'number',
-                                            'placeholder': '30'
-                                        }
-                                    }
-                                ]
-                            },
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 6
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VTextField',
-                                        'props': {
-                                            'model': 'timeout',
-                                            'label': '超时时间（秒）',
-                                            'type': 'number',
-                                            'placeholder': '3'
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VTextarea',
-                                        'props': {
-                                            'model': 'devices',
-                                            'label': '设备列表',
-                                            'placeholder': '蓝光机#192.168.1.88#\n芝杜SMB服务#192.168.1.89#445\nNFS服务器#192.168.1.90#2049',
-                                            'rows': 5,
-                                            'hint': '格式：设备名称#IP地址#端口（端口可选，留空则使用Ping检测）。每行一个设备。',
-                                            'persistent-hint': True
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VAlert',
-                                        'props': {
-                                            'type': 'info',
-                                            'variant': 'tonal',
-                                            'style': 'white-space: pre-line; font-size: 13px',
-                                            'text': '配置示例:\n\n'
-                                                    '• 播放器#192.168.1.88#\n'
-                                                    '   设备名称：播放器，IP：192.168.1.88，端口留空，使用Ping检测\n'
-                                                    '• NAS#192.168.1.89#445\n'
-                                                    '   设备名称：NAS，IP：192.168.1.89，端口：445（SMB），使用端口检测\n\n'
-                                                    '常用端口提示：SMB (445) | NFS (2049) | CD2 (19798) | 留空则使用Ping检测'
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'props': {
-                            'style': {
-                                'margin-top': '12px'
-                            },
-                        },
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VAlert',
-                                        'props': {
-                                            'type': 'info',
-                                            'variant': 'tonal',
-                                            'style': 'white-space: pre-line; font-size: 13px',
-                                            'text': '如何接收设备状态事件:\n\n'
-                                                    '其他插件可以通过监听 PluginTriggered 事件来接收设备状态变化通知。\n'
-                                                    '事件字段：device_name（设备名）、device_ip（IP地址）、device_port（端口）、status（online/offline）、timestamp（时间戳）。\n'
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    }
-                ]
-            }
-        ], {
+        return _FORM_SPEC, {
             "enabled": current_config.get("enabled", False),
             "devices": devices_text,
             "check_interval": current_config.get("check_interval", 30),
@@ -313,159 +465,519 @@ class DeviceCheck(_PluginBase):
     def get_page(self) -> List[dict]:
         pass
 
-    def _monitor_devices(self):
+    def _monitor_devices(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
         """
-        监控设备状态的线程函数
+        监控设备状态的线程函数，运行事件循环直到监控任务被取消
         """
         logger.info("设备状态监控线程已启动")
-        
-        while not self._stop_event.is_set():
-            try:
-                for device in self._devices:
-                    if self._stop_event.is_set():
-                        break
-                    
-                    device_name = device.get("name", "Unknown")
-                    device_ip = device.get("ip")
-                    device_port = device.get("port")
-                    
-                    if not device_ip:
-                        continue
-                    
-                    device_key = f"{device_ip}:{device_port or ''}"
-                    
-                    # 检测设备状态：有端口时使用端口检测，无端口时使用ping检测
-                    is_online = False
-                    if device_port is not None:
-                        try:
-                            # 确保端口是整数
-                            port_int = int(device_port) if not isinstance(device_port, int) else device_port
-                            is_online = self._check_port(device_ip, port_int)
-                        except (ValueError, TypeError):
-                            # 端口格式错误，回退到ping检测
-                            is_online = self._check_ping(device_ip)
-                    else:
-                        is_online = self._check_ping(device_ip)
-                    
-                    # 获取上次状态
-                    last_status = self._device_status.get(device_key, {}).get("status")
-                    current_status = "online" if is_online else "offline"
-                    
-                    # 更新状态缓存
-                    self._device_status[device_key] = {
-                        "status": current_status,
-                        "last_check": time()
-                    }
-                    
-                    # 如果状态发生变化，发送事件
-                    if last_status and last_status != current_status:
-                        logger.info(f"设备 {device_name} ({device_ip}) 状态变化: {last_status} -> {current_status}")
-                        self._send_device_event(
-                            device_name=device_name,
-                            device_ip=device_ip,
-                            device_port=device_port,
-                            status=current_status
-                        )
-                    elif not last_status:
-                        # 首次检测，也发送事件
-                        logger.info(f"设备 {device_name} ({device_ip}) 初始状态: {current_status}")
-                        self._send_device_event(
-                            device_name=device_name,
-                            device_ip=device_ip,
-                            device_port=device_port,
-                            status=current_status
-                        )
-                    
-                    # 短暂延迟，避免同时检测所有设备
-                    sleep(1)
-                
-                # 等待检测间隔
-                self._stop_event.wait(self._check_interval)
-                
-            except Exception as e:
-                logger.error(f"设备状态检测出错: {str(e)}")
-                sleep(5)  # 出错后等待5秒再继续
-        
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            asyncio.set_event_loop(None)
+            loop.close()
         logger.info("设备状态监控线程已停止")
 
-    def _check_ping(self, ip: str) -> bool:
+    async def _monitor_async(self):
         """
-        使用ping检测设备是否在线
+        监控循环，每轮并发检测所有设备
         """
+        # 主机名解析在线程池中执行，线程按需创建，运行中新增的设备也可以同时解析
+        # 线程池随事件循环结束而关闭
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(
+            max_workers=_RESOLVE_WORKERS,
+            thread_name_prefix="devicecheck"
+        ))
+        self._connect_limit = asyncio.Semaphore(_MAX_CONNECTS)
+        # 保持的连接、ICMP等待者和fping批次任务归本次监控任务所有，
+        # 插件重载后旧实例的监控任务清理时不会影响新实例
+        self._sockets = {}
+        self._icmp_waiters = {}
+        self._fping_tasks = set()
+        self._initialized = False
+        self._initial_rounds = 0
+
         try:
-            # Windows使用 -n，Linux/Mac使用 -c
-            param = '-n' if self._is_windows() else '-c'
-            command = ['ping', param, '1', '-w', str(int(self._timeout * 1000)), ip]
-            
-            result = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=self._timeout + 1
+            while True:
+                devices = self._devices
+                if not devices:
+                    # 设备列表为空时结束监控任务，重新配置设备后由 init_plugin 重新启动
+                    logger.info("未配置设备，设备状态监控任务退出")
+                    return
+                try:
+                    if devices is not self._status_devices:
+                        self._reset_status(devices)
+                    # 只检测已到检测时间的设备，持续离线的设备会逐步降低检测频率
+                    now = monotonic()
+                    due = [index for index, next_check in enumerate(self._next_check) if next_check <= now]
+                    results = await self._probe_all([devices[index] for index in due])
+                    previous = [self._status[index] for index in due]
+                    changed = [(index, last_status) for index, last_status, is_online in zip(due, previous, results)
+                               if self._update_status(index, is_online, now)]
+                    # 本轮所有设备状态更新完成后再统一发送事件
+                    # 初始状态不单独发送事件，所有设备的初始状态都确认后发送一次汇总事件；
+                    # 状态一直不稳定的设备不会阻塞汇总事件，达到轮数上限后按最近一次检测结果发送，
+                    # 这些设备之后确认初始状态时再单独发送事件
+                    initialized = self._initialized
+                    for index, last_status in changed:
+                        if last_status != _UNKNOWN or initialized:
+                            self._send_device_event(self._status_devices[index],
+                                                    _STATUS_NAMES[self._status[index]])
+                    if not initialized:
+                        self._initial_rounds += 1
+                        if _UNKNOWN not in self._status or self._initial_rounds >= _INITIAL_MAX_ROUNDS:
+                            self._initialized = True
+                            self._send_initialized_event()
+                    # 单个设备的状态变化只记录DEBUG日志，每轮有状态变化时汇总记录一条INFO日志
+                    if changed:
+                        online = self._status.count(_ONLINE)
+                        offline = self._status.count(_OFFLINE)
+                        logger.info(f"设备状态检测：{online} 个在线，{offline} 个离线，"
+                                    f"本轮 {len(changed)} 个设备状态变化")
+                except Exception as e:
+                    logger.error(f"设备状态检测出错: {str(e)}")
+                    await asyncio.sleep(5)  # 出错后等待5秒再继续
+                    continue
+
+                # 按本轮开始时间计算下一轮开始时间，检测耗时不会累积到检测周期中；
+                # 所有设备都在退避时直接等到最早需要检测的时间，减少空闲唤醒
+                # 停止插件时监控任务在此处或检测过程中被取消
+                deadline = max(now + self._check_interval, min(self._next_check))
+                await asyncio.sleep(max(0.0, deadline - monotonic()))
+        finally:
+            self._close_sockets()
+
+    def _reset_status(self, devices: List[_Device]):
+        """
+        设备列表变更后重建状态缓存，保留仍在列表中的设备的状态
+        """
+        previous = {device.key: index for index, device in enumerate(self._status_devices)}
+        positions = [previous.get(device.key) for device in devices]
+        if None in positions:
+            # 新增的设备确认初始状态后重新发送汇总事件
+            self._initialized = False
+            self._initial_rounds = 0
+        for name, typecode, default in _STATE_FIELDS:
+            values = getattr(self, name)
+            setattr(self, name, array(typecode, [default if position is None else values[position]
+                                                 for position in positions]))
+        self._status_devices = devices
+        # 关闭已移除设备保持的连接
+        keys = {device.key for device in devices}
+        for key in [key for key in self._sockets if key not in keys]:
+            self._sockets.pop(key).close()
+        hosts = {device.ip for device in devices}
+        self._addresses = {host: value for host, value in self._addresses.items() if host in hosts}
+
+    async def _probe_all(self, devices: List[_Device]) -> List[bool]:
+        """
+        并发检测所有设备，共用同一个超时预算，超时仍未完成或出错的检测视为离线
+        地址和端口相同的设备只检测一次，结果共用；单个检测出错不影响其他设备
+        """
+        if not devices:
+            return []
+        tasks: Dict[str, asyncio.Future] = {}
+        for device in devices:
+            if device.key not in tasks:
+                tasks[device.key] = asyncio.ensure_future(self._probe(device))
+        try:
+            done, pending = await asyncio.wait(tasks.values(), timeout=self._timeout)
+        finally:
+            # 超时或监控任务被取消时，结束本轮所有未完成的检测及fping批次
+            fping_tasks = list(self._fping_tasks)
+            for task in list(tasks.values()) + fping_tasks:
+                task.cancel()
+            self._fping_batch = None
+            # 等待fping批次结束并回收进程，避免停止插件时事件循环关闭而进程未回收
+            if fping_tasks:
+                await asyncio.gather(*fping_tasks, return_exceptions=True)
+        results: Dict[str, bool] = {}
+        for key, task in tasks.items():
+            if task not in done or task.cancelled():
+                results[key] = False
+            elif task.exception() is not None:
+                logger.debug(f"检测设备 {key} 出错: {str(task.exception())}")
+                results[key] = False
+            else:
+                results[key] = bool(task.result())
+        return [results[device.key] for device in devices]
+
+    async def _probe(self, device: _Device) -> bool:
+        """
+        检测单个设备：有端口时使用端口检测，无端口时使用ping检测
+        """
+        address = device.ip if device.literal else await self._resolve(device.ip)
+        if not address:
+            return False
+        if device.port is not None:
+            is_online = await self._check_port(address, device.port, device.key)
+        else:
+            is_online = await self._check_ping(address)
+        if not is_online:
+            # 检测失败时下次重新解析，以便及时发现设备地址变化（如DHCP重新分配）
+            self._addresses.pop(device.ip, None)
+        return is_online
+
+    async def _resolve(self, host: str) -> Optional[str]:
+        """
+        解析主机名，优先解析为IPv4地址，没有IPv4地址时使用IPv6地址，解析结果缓存一小时
+        """
+        cached = self._addresses.get(host)
+        if cached and cached[1] > monotonic():
+            return cached[0]
+        loop = asyncio.get_running_loop()
+        for family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                infos = await loop.getaddrinfo(host, None, family=family, type=socket.SOCK_STREAM)
+            except (OSError, UnicodeError) as e:
+                # 格式错误的主机名（如空标签或标签过长）在IDNA编码时抛出UnicodeError
+                error = e
+                continue
+            address = infos[0][4][0]
+            self._addresses[host] = (address, monotonic() + _RESOLVE_TTL)
+            return address
+        logger.debug(f"解析设备地址 {host} 失败: {str(error)}")
+        return None
+
+    def _update_status(self, index: int, is_online: bool, round_start: float) -> bool:
+        """
+        更新设备状态缓存并安排下次检测时间，返回是否需要发送状态事件
+        """
+        last_status = self._status[index]
+        current_status = _ONLINE if is_online else _OFFLINE
+
+        # 安排下次检测
+        if is_online:
+            self._fail_count[index] = 0
+            # 在线设备每轮都检测，保持的连接仍有效时只需一次非阻塞读取
+            self._next_check[index] = 0.0
+        else:
+            # 退避早已达到上限，计数封顶即可，避免长期离线的设备计数无限增长
+            fail_count = min(self._fail_count[index] + 1, 255)
+            self._fail_count[index] = fail_count
+            backoff = self._check_interval * min(2 ** (fail_count - 1), _MAX_BACKOFF_FACTOR)
+            self._next_check[index] = round_start + min(backoff, max(self._check_interval,
+                                                                     _MAX_BACKOFF_SECONDS))
+
+        # 状态未变化（最常见的情况）只需一次整数比较
+        if current_status == last_status:
+            if self._pending_count[index]:
+                self._pending[index] = _UNKNOWN
+                self._pending_count[index] = 0
+            return False
+
+        # 新状态需连续检测到多次才确认，避免设备状态抖动时频繁发送事件
+        if self._pending[index] == current_status:
+            self._pending_count[index] += 1
+        else:
+            self._pending[index] = current_status
+            self._pending_count[index] = 1
+        if self._pending_count[index] < _CONFIRM_SAMPLES:
+            return False
+
+        self._status[index] = current_status
+        self._pending[index] = _UNKNOWN
+        self._pending_count[index] = 0
+        device = self._status_devices[index]
+        if last_status != _UNKNOWN:
+            logger.debug(f"设备 {device.name} ({device.ip}) 状态变化: "
+                         f"{_STATUS_NAMES[last_status]} -> {_STATUS_NAMES[current_status]}")
+        else:
+            logger.debug(f"设备 {device.name} ({device.ip}) 初始状态: {_STATUS_NAMES[current_status]}")
+        return True
+
+    async def _check_ping(self, ip: str) -> bool:
+        """
+        使用ping检测设备是否在线，IPv4地址优先使用ICMP套接字，不支持时或IPv6地址调用ping命令
+        """
+        if self._icmp_available is not False and ':' not in ip:
+            result = await self._check_icmp(ip)
+            if result is not None:
+                return result
+        if self._fping_command:
+            return await self._check_fping(ip)
+        try:
+            # 只关心返回码，输出直接丢弃；独立会话避免收到主进程所在终端的信号
+            process = await asyncio.create_subprocess_exec(
+                *self._ping_command, ip,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
             )
-            return result.returncode == 0
+            try:
+                await process.wait()
+            finally:
+                # 超时被取消时结束ping进程
+                if process.returncode is None:
+                    process.kill()
+            return process.returncode == 0
         except Exception as e:
             logger.debug(f"Ping检测 {ip} 失败: {str(e)}")
             return False
 
-    def _check_port(self, ip: str, port: int) -> bool:
+    async def _check_fping(self, ip: str) -> bool:
         """
-        使用端口检测设备是否在线
+        使用fping检测设备是否在线，同一轮中同时到达的检测加入同一批次，只启动一个fping进程
+        """
+        batch = self._fping_batch
+        if batch is None:
+            waiters = {}
+            task = asyncio.ensure_future(self._run_fping(waiters))
+            self._fping_tasks.add(task)
+            task.add_done_callback(self._fping_tasks.discard)
+            batch = self._fping_batch = (waiters, task)
+        waiter = batch[0].get(ip)
+        if waiter is None:
+            waiter = batch[0][ip] = asyncio.get_running_loop().create_future()
+        # 同一地址的多个检测共用一个Future，单个检测被取消时不影响其他检测
+        return await asyncio.shield(waiter)
+
+    async def _run_fping(self, waiters: Dict[str, asyncio.Future]):
+        """
+        启动fping检测一批目标地址，逐行读取输出，地址一输出就结束对应的检测
+        fping结束、出错或批次被取消时，仍未输出的地址视为离线
+        批次任务开始运行后不再接收新的目标地址，之后到达的检测进入新的批次
         """
+        if self._fping_batch and self._fping_batch[0] is waiters:
+            self._fping_batch = None
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(self._timeout)
-            result = sock.connect_ex((ip, port))
-            sock.close()
-            return result == 0
+            process = await asyncio.create_subprocess_exec(
+                *self._fping_command, *waiters,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
+            try:
+                # fping -a 只输出在线的地址，不在线或无法访问的地址不输出
+                async for line in process.stdout:
+                    waiter = waiters.get(line.decode(errors="ignore").strip())
+                    if waiter and not waiter.done():
+                        waiter.set_result(True)
+                await process.wait()
+            finally:
+                if process.returncode is None:
+                    # 结束并回收未退出的fping进程
+                    process.kill()
+                    await process.wait()
         except Exception as e:
-            logger.debug(f"端口检测 {ip}:{port} 失败: {str(e)}")
+            logger.debug(f"fping检测 {', '.join(waiters)} 失败: {str(e)}")
+        finally:
+            for waiter in waiters.values():
+                if not waiter.done():
+                    waiter.set_result(False)
+
+    async def _check_icmp(self, ip: str) -> Optional[bool]:
+        """
+        通过非特权ICMP数据报套接字发送回显请求，无需派生ping进程
+        所有设备共用一个套接字，应答按序号分发给对应的检测
+        系统不支持时返回None，由调用方回退到ping命令
+        """
+        loop = asyncio.get_running_loop()
+        if not self._icmp_sock:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            except OSError as e:
+                if self._icmp_available is None:
+                    logger.info(f"系统不支持非特权ICMP套接字，使用ping命令检测: {str(e)}")
+                self._icmp_available = False
+                return None
+            self._icmp_available = True
+            sock.setblocking(False)
+            loop.add_reader(sock.fileno(), self._on_icmp_reply)
+            self._icmp_sock = sock
+            self._icmp_ident = os.getpid() & 0xffff
+
+        self._icmp_seq = (self._icmp_seq + 1) & 0xffff
+        seq = self._icmp_seq
+        header = struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, 0, self._icmp_ident, seq)
+        checksum = _icmp_checksum(header + _ICMP_PAYLOAD)
+        packet = struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, checksum, self._icmp_ident, seq) + _ICMP_PAYLOAD
+
+        waiter = loop.create_future()
+        self._icmp_waiters[seq] = (ip, waiter)
+        try:
+            self._icmp_sock.sendto(packet, (ip, 0))
+            return await waiter
+        except OSError as e:
+            logger.debug(f"ICMP检测 {ip} 失败: {str(e)}")
             return False
+        finally:
+            self._icmp_waiters.pop(seq, None)
+
+    def _on_icmp_reply(self):
+        """
+        读取ICMP套接字上的所有应答，唤醒序号和来源地址匹配的检测
+        """
+        while True:
+            try:
+                data, address = self._icmp_sock.recvfrom(1024)
+            except OSError:
+                # 没有更多数据（BlockingIOError）或收到错误报文
+                return
+            # 部分系统（如macOS）返回的数据包含IP头
+            if data and data[0] >> 4 == 4:
+                data = data[(data[0] & 0x0f) * 4:]
+            if len(data) < 8 or data[0] != _ICMP_ECHO_REPLY:
+                continue
+            seq = struct.unpack_from("!H", data, 6)[0]
+            ip, waiter = self._icmp_waiters.get(seq, (None, None))
+            if waiter and ip == address[0] and not waiter.done():
+                waiter.set_result(True)
 
-    def _is_windows(self) -> bool:
+    async def _check_port(self, ip: str, port: int, key: str) -> bool:
         """
-        判断是否为Windows系统
+        使用端口检测设备是否在线
+        连接成功后保持连接并开启TCP保活，下一轮连接仍有效时直接判定在线，无需重新握手
+        非阻塞连接注册在事件循环的同一个选择器上，超时由 _probe_all 统一控制
         """
-        import platform
-        return platform.system().lower() == 'windows'
+        sock = self._sockets.pop(key, None)
+        if sock:
+            if self._is_connected(sock):
+                self._sockets[key] = sock
+                return True
+            sock.close()
+
+        loop = asyncio.get_running_loop()
+        async with self._connect_limit:
+            sock = socket.socket(socket.AF_INET6 if ':' in ip else socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, (ip, port))
+            except OSError as e:
+                logger.debug(f"端口检测 {ip}:{port} 失败: {str(e)}")
+                sock.close()
+                return False
+            except asyncio.CancelledError:
+                sock.close()
+                raise
+
+        if self._enable_keepalive(sock):
+            self._sockets[key] = sock
+        else:
+            sock.close()
+        return True
 
-    def _send_device_event(self, device_name: str, device_ip: str, 
-                          device_port: Optional[int], status: str):
+    def _enable_keepalive(self, sock: socket.socket) -> bool:
+        """
+        开启TCP保活，按检测间隔和超时时间设置探测参数，空闲时间加两次探测间隔不超过检测间隔，
+        使设备断线能在下一轮检测时被发现
+        系统不支持设置探测参数时返回False，此时不保持连接，避免按系统默认（通常2小时）才发现断线
+        """
+        # macOS 上空闲时间选项名为 TCP_KEEPALIVE
+        idle_option = getattr(socket, "TCP_KEEPIDLE", None) or getattr(socket, "TCP_KEEPALIVE", None)
+        if idle_option is None or not all(hasattr(socket, option) for option in ("TCP_KEEPINTVL", "TCP_KEEPCNT")):
+            return False
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.IPPROTO_TCP, idle_option, max(1, self._check_interval - 2 * self._timeout))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, self._timeout))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 2)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _is_connected(sock: socket.socket) -> bool:
+        """
+        检查保持的连接是否仍然有效：对端关闭、连接被重置或保活探测失败时返回False
+        """
+        try:
+            # 丢弃对端主动发送的数据（如服务欢迎信息），读到EOF说明对端已关闭
+            while sock.recv(4096):
+                pass
+            return False
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    def _close_sockets(self):
+        """
+        关闭所有保持的连接及ICMP套接字
+        """
+        for sock in self._sockets.values():
+            sock.close()
+        self._sockets.clear()
+        if self._icmp_sock:
+            asyncio.get_running_loop().remove_reader(self._icmp_sock.fileno())
+            self._icmp_sock.close()
+            self._icmp_sock = None
+
+    def _send_device_event(self, device: _Device, status: str):
         """
         发送设备状态事件
         """
         try:
-            event_data = {
-                "plugin_id": self.__class__.__name__,
-                "event_name": f"device_{status}",  # device_online 或 device_offline
-                "device_name": device_name,
-                "device_ip": device_ip,
-                "device_port": device_port,
-                "status": status,
-                "timestamp": time()
-            }
+            # 复制设备的事件数据模板，只填入随事件变化的字段
+            event_data = device.event.copy()
+            event_data["event_name"] = f"device_{status}"  # device_online 或 device_offline
+            event_data["status"] = status
+            event_data["timestamp"] = time()
             
             # 发送PluginTriggered事件，其他插件可以监听此事件
+            # 广播事件由事件管理器放入队列后异步分发，不会等待监听方处理完成，检测循环无需另设发送线程
             self.eventmanager.send_event(
                 EventType.PluginTriggered,
                 event_data
             )
             
-            logger.info(f"已发送设备状态事件: {device_name} ({device_ip}) -> {status}")
-            logger.info(f"事件数据: {event_data}")
+            logger.debug(f"已发送设备状态事件: {device.name} ({device.ip}) -> {status}")
+            logger.debug(f"事件数据: {event_data}")
             
         except Exception as e:
             logger.error(f"发送设备状态事件失败: {str(e)}")
 
+    def _send_initialized_event(self):
+        """
+        发送所有设备初始状态的汇总事件，尚未确认的设备使用最近一次检测结果（等待确认的状态）
+        """
+        try:
+            event_data = {
+                "plugin_id": self.__class__.__name__,
+                "event_name": "devices_initialized",
+                "devices": [
+                    {
+                        "device_name": device.name,
+                        "device_ip": device.ip,
+                        "device_port": device.port,
+                        "status": _STATUS_NAMES[status or pending]
+                    }
+                    for device, status, pending in zip(self._status_devices, self._status, self._pending)
+                ],
+                "timestamp": time()
+            }
+            self.eventmanager.send_event(
+                EventType.PluginTriggered,
+                event_data
+            )
+            logger.info(f"已发送设备初始状态事件，共 {len(event_data['devices'])} 个设备")
+            logger.debug(f"事件数据: {event_data}")
+        except Exception as e:
+            logger.error(f"发送设备初始状态事件失败: {str(e)}")
+
     def stop_service(self):
         """
         停止插件服务
         """
         logger.info("正在停止设备状态检测插件...")
-        self._stop_event.set()
+        # 取消监控任务，正在进行的检测和检测间隔的等待都会立即结束
+        if self._loop and self._monitor_task:
+            try:
+                self._loop.call_soon_threadsafe(self._monitor_task.cancel)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
         
         if self._monitor_thread and self._monitor_thread.is_alive():
             self._monitor_thread.join(timeout=5)
+        self._loop = None
+        self._monitor_task = None
         
         logger.info("设备状态检测插件已停止")
 
@@ -1,11 +1,175 @@
-from typing import Any, List, Dict, Tuple
+from typing import Any, List, Dict, NamedTuple, Optional, Tuple
 import re
+import sys
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+try:
+    # 可选的线性时间正则引擎，未安装时使用 re
+    import re2
+except ImportError:
+    re2 = None
 
 from app.core.event import eventmanager, Event
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import ChainEventType
 
+# 规则解析结果缓存的最大条数
+_PARSE_CACHE_SIZE = 8
+# 文件名匹配结果缓存的最大条数
+_MATCH_CACHE_SIZE = 1024
+
+# re 与 re2 含义不同的写法：re 中 {,n} 表示重复0到n次，[[:digit:]] 是普通字符集合，
+# re2 则分别当作普通字符和POSIX字符类；[. 和 [= 同理。含这些写法的关键字不使用 re2
+_RE2_UNSAFE = ("{,", "[:", "[.", "[=")
+
+# 修改重命名结果时标记的来源
+_SOURCE = "FileNameCategory"
+
+
+@lru_cache(maxsize=4096)
+def _pinyin_first_letter(char: str) -> str:
+    """
+    获取单个中文字符的拼音首字母（大写），无法获取时返回 "其他"
+    pypinyin 在首次使用时才导入，未使用 {首字母} 时无需加载拼音词典
+    """
+    try:
+        import pypinyin
+        pinyin = pypinyin.pinyin(char, style=pypinyin.Style.FIRST_LETTER)
+        if pinyin and pinyin[0][0].isalpha():
+            return pinyin[0][0].upper()
+    except ImportError:
+        logger.warning("pypinyin未安装，无法处理中文首字母")
+    except Exception as e:
+        logger.warning(f"获取首字母失败: {e}")
+    return "其他"
+
+
+class _Rule(NamedTuple):
+    """
+    解析后的分类规则，prefix 为渲染路径前缀（分类加 /），分类含模板变量时为空，匹配后再处理模板；
+    regex 为不区分大小写编译的关键字，为 None 表示匹配所有文件；文件名只含ASCII字符时，
+    literals 不为空则在小写文件名中查找子串，lower_regex 不为空则用按小写关键字编译的正则匹配小写文件名
+    """
+    path: str
+    pattern: str
+    category: str
+    prefix: str
+    regex: Optional[Any]
+    literals: Optional[Tuple[str, ...]]
+    lower_regex: Optional[Any]
+
+
+# 插件配置页面的表单结构，内容固定，get_form 直接返回，调用方不应修改
+_FORM_SPEC: List[dict] = [
+    {
+        'component': 'VForm',
+        'content': [
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                            'md': 6
+                        },
+                        'content': [
+                            {
+                                'component': 'VSwitch',
+                                'props': {
+                                    'model': 'enabled',
+                                    'label': '启用插件',
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                        },
+                        'content': [
+                            {
+                                'component': 'VAlert',
+                                'props': {
+                                    'type': 'info',
+                                    'variant': 'tonal',
+                                    'style': 'white-space: pre-line; font-size: 13px',
+                                    'text': '规则格式: 路径#关键字#分类\n'
+                                            '• 路径: 目标路径过滤，限定此条规则仅对该路径下的文件生效，可以使用正则表达式通配，留空表示匹配所有路径\n'
+                                            '• 关键字: 支持正则表达式，不区分大小写，多个关键字用 | 分隔；留空或 .* 表示匹配所有文件\n'
+                                            '• 分类: 子分类名称，支持多级路径如 UHD/杜比视界，支持模板变量 {年代} {首字母}\n'
+                                            '说明: 每行一条规则，按顺序匹配，第一个匹配的规则生效。匹配后会在原分类下创建子分类。'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12
+                        },
+                        'content': [
+                            {
+                                'component': 'VTextarea',
+                                'props': {
+                                    'model': 'rules',
+                                    'label': '分类规则',
+                                    'placeholder': '#HDHome#HDHome\n#CHD|CHDBits#CHDBits/ISO\n/downloads##/{年代}',
+                                    'rows': 8,
+                                    'hint': '分类规则，每行一条，适用于电影和电视剧',
+                                    'persistent-hint': True
+                                }
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                        },
+                        'content': [
+                            {
+                                'component': 'VAlert',
+                                'props': {
+                                    'type': 'warning',
+                                    'variant': 'tonal',
+                                    'style': 'white-space: pre-line; font-size: 13px',
+                                    'text': '规则示例:\n'
+                                            '• #CHD|CHDBits#CHDBits/原盘\n'
+                                            '   文件名包含 CHD 或 CHDBits 时，创建子分类: CHDBits/原盘/\n'
+                                            '• /downloads##/{年代}\n'
+                                            '   目标路径包含 /downloads 的所有文件，按年代分类: /1990s/，/2000s/，/2010s/，/2020s/\n'
+                                            '• /我的接收#UHD|4K#4K/{首字母}\n'
+                                            '   目标路径包含 /我的接收 且文件名包含 UHD 或 4K 时，创建 4K 子分类，并按照首字母分类: 4K/A/, 4K/B/, 4K/C/, ...'
+                                }
+                            }
+                        ]
+                    }
+                ]
+            }
+        ]
+    }
+]
+
 
 class FileNameCategory(_PluginBase):
     # 插件名称
@@ -15,7 +179,7 @@ class FileNameCategory(_PluginBase):
     # 插件图标
     plugin_icon = "Bookstack_A.png"
     # 插件版本
-    plugin_version = "1.0"
+    plugin_version = "1.1"
     # 插件作者
     plugin_author = "narapeka"
     # 作者主页
@@ -29,60 +193,224 @@ class FileNameCategory(_PluginBase):
 
     _enabled = False
     _rules = []
+    # 按顺序将路径相同的相邻规则分为一组
+    _rule_groups = []
+    # 是否存在带路径过滤的规则
+    _needs_path = False
+    # 所有规则都限定了路径时为不重复的路径，否则为空
+    _path_filters = ()
+    # 规则解析结果缓存 {规则文本: (规则列表, 规则分组)}，规则文本未变化时重新加载配置无需重新解析和编译
+    _parse_cache: Dict[str, Tuple[List[_Rule], List[Dict[str, Any]]]] = {}
+    # 匹配结果缓存 {(原始文件名, 目标路径): (匹配的规则, 因路径跳过的规则数)}，同一文件重复触发时无需重新匹配
+    _match_cache: Dict[Tuple[str, str], Tuple[Optional[_Rule], int]] = {}
+    # 多个整理线程可能同时触发事件，写入和淘汰匹配结果缓存时加锁
+    _match_lock = threading.Lock()
 
     def init_plugin(self, config: dict = None):
         if config:
             self._enabled = config.get("enabled", False)
             # 解析分类规则
-            self._rules = self._parse_rules(config.get("rules", ""))
+            rules_text = config.get("rules", "")
+            parsed = self._parse_cache.get(rules_text)
+            if parsed is None:
+                rules = self._parse_rules(rules_text)
+                parsed = (rules, self._group_rules(rules))
+                if len(self._parse_cache) >= _PARSE_CACHE_SIZE:
+                    # 淘汰最早缓存的规则
+                    self._parse_cache.pop(next(iter(self._parse_cache)))
+                self._parse_cache[rules_text] = parsed
+            self._rules, self._rule_groups = parsed
+            paths = [group["path"] for group in self._rule_groups]
+            self._needs_path = any(paths)
+            self._path_filters = tuple(dict.fromkeys(paths)) if paths and all(paths) else ()
+        # 规则可能变化，设置新规则后清空匹配结果缓存
+        with self._match_lock:
+            self._match_cache = {}
 
-    def _parse_rules(self, rules_text: str) -> List[Dict[str, str]]:
+    def _parse_rules(self, rules_text: str) -> List[_Rule]:
         """
         解析文本格式的规则
         格式: path#keyword#category (每行一条规则)
+        关键字在解析时编译，无效的正则表达式在此跳过
         """
         rules = []
         if not rules_text:
             return rules
         
-        for line in rules_text.strip().split('\n'):
+        for line in rules_text.splitlines():
             line = line.strip()
             if not line or line.startswith('#'):
                 # 跳过空行和注释行
                 continue
             
-            parts = line.split('#')
-            if len(parts) >= 3:
-                # path#keyword#category (keyword可为空表示匹配所有)
-                path = parts[0].strip()
-                pattern = parts[1].strip()
-                category = parts[2].strip()
-                
-                if category:  # pattern可为空（表示匹配所有）
-                    rules.append({
-                        "path": path,
-                        "pattern": pattern,
-                        "category": category
-                    })
-                else:
-                    logger.warning(f"文件名分类：跳过无效规则（category为空）: {line}")
-            elif len(parts) == 2:
+            head, sep, rest = line.partition('#')
+            if not sep:
+                logger.warning(f"文件名分类：跳过格式错误的规则: {line}")
+                continue
+            mid, sep, tail = rest.partition('#')
+            if sep:
+                # path#keyword#category (keyword可为空表示匹配所有，category中可以包含#)
+                path, pattern, category = head, mid, tail
+            else:
                 # keyword#category (无path限制)
-                pattern = parts[0].strip()
-                category = parts[1].strip()
-                
-                if category:  # pattern可为空（表示匹配所有）
-                    rules.append({
-                        "path": "",
-                        "pattern": pattern,
-                        "category": category
-                    })
-                else:
-                    logger.warning(f"文件名分类：跳过无效规则（category为空）: {line}")
+                path, pattern, category = "", head, mid
+            
+            category = category.strip()
+            if category:  # pattern可为空（表示匹配所有）
+                # 路径和分类常在多条规则中重复，驻留后共用同一字符串对象
+                self._append_rule(rules, sys.intern(path.strip()), pattern.strip(), sys.intern(category))
             else:
-                logger.warning(f"文件名分类：跳过格式错误的规则: {line}")
+                logger.warning(f"文件名分类：跳过无效规则（category为空）: {line}")
         
-        return rules
+        return self._drop_shadowed_rules(rules)
+
+    @staticmethod
+    def _append_rule(rules: List[_Rule], path: str, pattern: str, category: str):
+        """
+        编译规则的关键字并加入规则列表
+        """
+        regex = None
+        literals = None
+        lower_regex = None
+        # 空pattern或.*表示匹配所有文件，无需正则匹配
+        if pattern and pattern != ".*":
+            try:
+                # 不区分大小写
+                regex = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.error(f"文件名分类：正则表达式错误，跳过规则 '{pattern}': {str(e)}")
+                return
+            # 只含ASCII普通字符的关键字，匹配ASCII文件名时不区分大小写的匹配等同于在小写文件名中查找小写关键字
+            parts = pattern.split('|')
+            if all(part and part.isascii() and re.escape(part) == part for part in parts):
+                literals = tuple(part.lower() for part in parts)
+            # 不含内联标志、且转义转为小写后含义不变（如 \d、\s，而 \D、\W、\x41 会改变，
+            # \101 等八进制转义和反向引用也不安全）的ASCII关键字，转为小写后匹配小写的ASCII文件名
+            elif (pattern.isascii()
+                  and not re.search(r"\(\?[aiLmsux-]", pattern)
+                  and all(not escaped.isalnum() or escaped in "dswbnrtf"
+                          for escaped in re.findall(r"\\(.)", pattern))):
+                try:
+                    lower_regex = FileNameCategory._compile_lower(pattern.lower())
+                except re.error:
+                    pass
+        templated = "{年代}" in category or "{首字母}" in category
+        rules.append(_Rule(path, pattern, category, "" if templated else category + "/",
+                           regex, literals, lower_regex))
+
+    @staticmethod
+    def _drop_shadowed_rules(rules: List[_Rule]) -> List[_Rule]:
+        """
+        去除永远不会生效的规则：前面存在路径相同的规则，且凡是该规则能匹配的文件名前面的规则都能匹配
+        包括关键字相同、前面的规则匹配所有文件、以及普通字符串关键字都包含前面规则的某个关键字
+        """
+        kept = []
+        # {路径: 已保留的规则}
+        earlier = {}
+        for index, rule in enumerate(rules):
+            shadow = None
+            for prev in earlier.get(rule.path, ()):
+                if (prev.pattern == rule.pattern
+                        or prev.regex is None
+                        or (prev.literals and rule.literals
+                            and all(any(literal in other for literal in prev.literals)
+                                    for other in rule.literals))):
+                    shadow = prev
+                    break
+            if shadow:
+                logger.info(f"文件名分类：规则 '{rule.path}#{rule.pattern}#{rule.category}' "
+                            f"被前面的规则 '{shadow.path}#{shadow.pattern}#{shadow.category}' 覆盖，不会生效，已忽略")
+                continue
+            kept.append(rule)
+            earlier.setdefault(rule.path, []).append(rule)
+            # 不限路径且匹配所有文件的规则之后的规则由 _group_rules 统一提示
+            if not rule.path and rule.regex is None:
+                kept.extend(rules[index + 1:])
+                break
+        return kept
+
+    @staticmethod
+    def _compile_lower(pattern: str):
+        """
+        编译小写关键字，已安装re2时优先使用re2
+        """
+        # re2 中 \d、\s、\w、\b 只匹配ASCII字符，与 re 不同，含此类转义时仍使用 re
+        if re2 is not None and '\\' not in pattern and not any(token in pattern for token in _RE2_UNSAFE):
+            try:
+                return re2.compile(pattern)
+            except Exception:
+                # re2 不支持的语法（如反向引用、环视）回退到 re
+                pass
+        return re.compile(pattern)
+
+    @staticmethod
+    def _group_rules(rules: List[_Rule]) -> List[Dict[str, Any]]:
+        """
+        将路径相同的相邻规则分为一组，保持规则顺序，每组只需检查一次路径
+        matchers 为组内每条规则的 (literals, regex.search, lower_regex.search, rule) 元组，匹配时直接解包
+        """
+        groups = []
+        for index, rule in enumerate(rules):
+            if not groups or groups[-1]["path"] != rule.path:
+                groups.append({"path": rule.path, "rules": [], "matchers": []})
+            regex = rule.regex
+            lower_regex = rule.lower_regex
+            groups[-1]["rules"].append(rule)
+            groups[-1]["matchers"].append((rule.literals, regex.search if regex else None,
+                                           lower_regex.search if lower_regex else None, rule))
+            # 不限路径且匹配所有文件的规则之后的规则永远不会生效，不再参与匹配
+            if not rule.path and rule.regex is None and index + 1 < len(rules):
+                logger.warning(f"文件名分类：规则 '{rule.pattern}#{rule.category}' 匹配所有文件，"
+                               f"其后的 {len(rules) - index - 1} 条规则不会生效")
+                break
+        return groups
+
+    @staticmethod
+    def _match_group(group: Dict[str, Any], name: str, name_lower: str, is_ascii: bool) -> Optional[_Rule]:
+        """
+        返回组内第一个匹配文件名的规则，没有匹配时返回None
+        普通字符串关键字在小写文件名中查找子串，其他关键字使用正则表达式匹配；
+        文件名含非ASCII字符时，都使用不区分大小写的正则表达式匹配原文件名
+        """
+        for literals, search, lower_search, rule in group["matchers"]:
+            if literals and is_ascii:
+                for literal in literals:
+                    if literal in name_lower:
+                        return rule
+            elif lower_search and is_ascii:
+                if lower_search(name_lower):
+                    return rule
+            # search为None表示匹配所有文件
+            elif search is None or search(name):
+                return rule
+        return None
+
+    def _match_rules(self, name: str, target_path: str) -> Tuple[Optional[_Rule], int]:
+        """
+        按组遍历规则进行匹配（按顺序，第一个匹配的生效）
+        返回匹配的规则（没有匹配时为None）和因目标路径不匹配跳过的规则数
+        """
+        name_lower = name.lower()
+        # 含非ASCII字符时 lower() 与 IGNORECASE 的结果可能不同（如 İ 转小写后为两个字符，ı、ſ 与 i、s 互相匹配）
+        is_ascii = name.isascii()
+        # 同一路径可能出现在多个组中，每个路径只检查一次
+        path_matched = {"": True}
+        skipped = 0
+        for group in self._rule_groups:
+            rule_path = group["path"]
+
+            # 检查路径过滤（包含匹配）
+            matched = path_matched.get(rule_path)
+            if matched is None:
+                matched = path_matched[rule_path] = rule_path in target_path
+            if not matched:
+                skipped += len(group["rules"])
+                continue
+
+            rule = self._match_group(group, name, name_lower, is_ascii)
+            if rule:
+                return rule, skipped
+        return None, skipped
 
     def _get_decade(self, year) -> str:
         """
@@ -90,6 +418,9 @@ class FileNameCategory(_PluginBase):
         """
         if not year:
             return "未知年代"
+        # 元数据中的年份通常已是整数
+        if isinstance(year, int):
+            return f"{year // 10 * 10}s"
         try:
             decade = (int(year) // 10) * 10
             return f"{decade}s"
@@ -116,18 +447,8 @@ class FileNameCategory(_PluginBase):
         if first_char.isalpha() and ord(first_char) < 128:
             return first_char.upper()
         
-        # 对于中文/其他字符，使用拼音
-        try:
-            import pypinyin
-            pinyin = pypinyin.pinyin(first_char, style=pypinyin.Style.FIRST_LETTER)
-            if pinyin and pinyin[0][0].isalpha():
-                return pinyin[0][0].upper()
-        except ImportError:
-            logger.warning("pypinyin未安装，无法处理中文首字母")
-        except Exception as e:
-            logger.warning(f"获取首字母失败: {e}")
-        
-        return "其他"
+        # 对于中文/其他字符，使用拼音（按字符缓存）
+        return _pinyin_first_letter(first_char)
 
     def get_state(self) -> bool:
         return self._enabled
@@ -143,117 +464,11 @@ class FileNameCategory(_PluginBase):
         """
         拼装插件配置页面，需要返回两块数据：1、页面配置；2、数据结构
         """
-        # 获取当前配置
-        current_config = self.get_config() or {}
-        
-        return [
-            {
-                'component': 'VForm',
-                'content': [
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 6
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VSwitch',
-                                        'props': {
-                                            'model': 'enabled',
-                                            'label': '启用插件',
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VAlert',
-                                        'props': {
-                                            'type': 'info',
-                                            'variant': 'tonal',
-                                            'style': 'white-space: pre-line; font-size: 13px',
-                                            'text': '规则格式: 路径#关键字#分类\n'
-                                                    '• 路径: 目标路径过滤，限定此条规则仅对该路径下的文件生效，可以使用正则表达式通配，留空表示匹配所有路径\n'
-                                                    '• 关键字: 支持正则表达式，不区分大小写，多个关键字用 | 分隔；留空或 .* 表示匹配所有文件\n'
-                                                    '• 分类: 子分类名称，支持多级路径如 UHD/杜比视界，支持模板变量 {年代} {首字母}\n'
-                                                    '说明: 每行一条规则，按顺序匹配，第一个匹配的规则生效。匹配后会在原分类下创建子分类。'
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VTextarea',
-                                        'props': {
-                                            'model': 'rules',
-                                            'label': '分类规则',
-                                            'placeholder': '#HDHome#HDHome\n#CHD|CHDBits#CHDBits/ISO\n/downloads##/{年代}',
-                                            'rows': 8,
-                                            'hint': '分类规则，每行一条，适用于电影和电视剧',
-                                            'persistent-hint': True
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VAlert',
-                                        'props': {
-                                            'type': 'warning',
-                                            'variant': 'tonal',
-                                            'style': 'white-space: pre-line; font-size: 13px',
-                                            'text': '规则示例:\n'
-                                                    '• #CHD|CHDBits#CHDBits/原盘\n'
-                                                    '   文件名包含 CHD 或 CHDBits 时，创建子分类: CHDBits/原盘/\n'
-                                                    '• /downloads##/{年代}\n'
-                                                    '   目标路径包含 /downloads 的所有文件，按年代分类: /1990s/，/2000s/，/2010s/，/2020s/\n'
-                                                    '• /我的接收#UHD|4K#4K/{首字母}\n'
-                                                    '   目标路径包含 /我的接收 且文件名包含 UHD 或 4K 时，创建 4K 子分类，并按照首字母分类: 4K/A/, 4K/B/, 4K/C/, ...'
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    }
-                ]
-            }
-        ], {
-            "enabled": current_config.get("enabled", False),
-            "rules": current_config.get("rules", "")
+        # 当前配置覆盖默认值
+        return _FORM_SPEC, {
+            "enabled": False,
+            "rules": "",
+            **(self.get_config() or {})
         }
 
     def get_page(self) -> List[dict]:
@@ -267,36 +482,47 @@ class FileNameCategory(_PluginBase):
         logger.debug(f"文件名分类插件触发！")
 
         # 基础验证
-        if not self.get_state():
+        if not self._enabled:
             logger.debug(f"文件名分类插件未启用！")
             return
+        # 没有规则时无需解析事件数据
+        if not self._rules:
+            logger.debug(f"文件名分类：没有配置规则，跳过处理")
+            return
         if not event:
             logger.warning(f"文件名分类异常：事件对象为空")
             return
-        if not hasattr(event, 'event_data'):
+        data = getattr(event, 'event_data', None)
+        if data is None:
             logger.warning(f"文件名分类异常：事件数据为空")
             return
 
         try:
-            data = event.event_data
-
             # 验证必要的数据字段
-            if not hasattr(data, 'rename_dict') or not data.rename_dict:
+            rename_dict = getattr(data, 'rename_dict', None)
+            if not rename_dict:
                 logger.warning(f"文件名分类异常：rename_dict为空")
                 return
 
-            if not hasattr(data, 'render_str') or not data.render_str:
+            render_str = getattr(data, 'render_str', None)
+            if not render_str:
                 logger.warning(f"文件名分类异常：render_str为空")
                 return
 
-            rename_dict = data.rename_dict
             media_info = rename_dict.get("__mediainfo__")
-            render_str = data.render_str
             
             if not media_info:
                 logger.warning(f"文件名分类异常：__mediainfo__为空")
                 return
 
+            # 获取目标路径（用于路径匹配），没有路径过滤规则时无需转换
+            data_path = getattr(data, 'path', None)
+            target_path = str(data_path) if data_path and self._needs_path else ""
+            # 所有规则都限定了路径，而目标路径不包含其中任何一个时，没有规则可能生效
+            if self._path_filters and not any(rule_path in target_path for rule_path in self._path_filters):
+                logger.debug(f"文件名分类：目标路径不在任何规则的路径范围内，跳过处理")
+                return
+
             # 获取原始文件名
             original_name = ""
             
@@ -307,87 +533,63 @@ class FileNameCategory(_PluginBase):
             if not original_name:
                 meta = rename_dict.get("__meta__")
                 if meta:
-                    if hasattr(meta, 'org_string') and meta.org_string:
-                        original_name = meta.org_string
-                    elif hasattr(meta, 'title') and meta.title:
-                        original_name = meta.title
-                    elif hasattr(meta, 'name') and meta.name:
-                        original_name = meta.name
+                    original_name = (getattr(meta, 'org_string', None)
+                                     or getattr(meta, 'title', None)
+                                     or getattr(meta, 'name', None)
+                                     or "")
             
-            # 方法3: 从path获取
-            if not original_name and hasattr(data, 'path') and data.path:
-                from pathlib import Path
-                path_obj = Path(str(data.path))
-                if path_obj.name:
-                    original_name = path_obj.name
+            # 方法3: 从path获取（Path 按所在系统的分隔符拆分，Windows 路径同样适用）
+            if not original_name and data_path:
+                original_name = Path(data_path).name
             
             if not original_name:
                 logger.debug(f"文件名分类：无法获取原始文件名，跳过处理")
                 return
 
-            # 获取目标路径（用于路径匹配）
-            target_path = ""
-            if hasattr(data, 'path') and data.path:
-                target_path = str(data.path)
-
-            # 检查是否有规则
-            if not self._rules:
-                logger.debug(f"文件名分类：没有配置规则，跳过处理")
-                return
-
             # 获取当前分类
             current_category = media_info.category or ""
             new_category = None
 
-            logger.debug(f"文件名分类：原分类 '{current_category}'，开始匹配 {len(self._rules)} 条规则...")
-
-            # 遍历规则进行匹配（按顺序，第一个匹配的生效）
-            for rule in self._rules:
-                rule_path = rule.get("path", "")
-                pattern = rule.get("pattern", "")
-                category = rule.get("category", "")
-
-                # 检查路径过滤（包含匹配）
-                if rule_path and rule_path not in target_path:
-                    logger.debug(f"文件名分类：规则 '{pattern}' 跳过（目标路径不包含 '{rule_path}'）")
-                    continue
-
-                # 匹配文件名（空pattern或.*表示匹配所有）
-                matched = False
-                if not pattern or pattern == ".*":
-                    # 空pattern或.*表示匹配所有文件
-                    matched = True
-                else:
-                    # 使用正则表达式匹配（不区分大小写）
-                    try:
-                        if re.search(pattern, original_name, re.IGNORECASE):
-                            matched = True
-                    except re.error as e:
-                        logger.error(f"文件名分类：正则表达式错误 '{pattern}': {str(e)}")
-                        continue
-                
-                if matched:
-                    new_category = category
-                    break
+            # 匹配规则，同一文件重复触发时使用缓存的结果
+            key = (original_name, target_path)
+            rule_groups = self._rule_groups
+            result = self._match_cache.get(key)
+            if result is None:
+                result = self._match_rules(original_name, target_path)
+                with self._match_lock:
+                    # 匹配期间重新加载了规则时不写入缓存，避免旧规则的结果留在新的缓存中
+                    if rule_groups is self._rule_groups:
+                        if len(self._match_cache) >= _MATCH_CACHE_SIZE:
+                            self._match_cache.pop(next(iter(self._match_cache)))
+                        self._match_cache[key] = result
+            rule, skipped = result
+            pattern = ""
+            prefix = ""
+            if rule:
+                pattern = rule.pattern
+                new_category = rule.category
+                prefix = rule.prefix
 
             # 如果找到了新的分类，修改渲染路径
             if new_category:
-                # 处理模板变量 {年代}
-                if "{年代}" in new_category:
-                    year = rename_dict.get("year")
-                    decade = self._get_decade(year)
-                    new_category = new_category.replace("{年代}", decade)
-                
-                # 处理模板变量 {首字母}
-                if "{首字母}" in new_category:
-                    # 优先使用中文标题，如果没有则使用英文标题
-                    name = rename_dict.get("title") or rename_dict.get("en_title", "")
-                    first_letter = self._get_first_letter(name)
-                    new_category = new_category.replace("{首字母}", first_letter)
+                # 没有预先生成前缀的规则含有模板变量
+                if not prefix:
+                    # 处理模板变量 {年代}
+                    if "{年代}" in new_category:
+                        year = rename_dict.get("year")
+                        decade = self._get_decade(year)
+                        new_category = new_category.replace("{年代}", decade)
+
+                    # 处理模板变量 {首字母}
+                    if "{首字母}" in new_category:
+                        # 优先使用中文标题，如果没有则使用英文标题
+                        name = rename_dict.get("title") or rename_dict.get("en_title", "")
+                        first_letter = self._get_first_letter(name)
+                        new_category = new_category.replace("{首字母}", first_letter)
                 
                 # 计算最终分类（在原分类后追加新分类）
                 if current_category:
-                    final_category = f"{current_category}/{new_category}"
+                    final_category = current_category + "/" + new_category
                 else:
                     final_category = new_category
                 
@@ -395,21 +597,28 @@ class FileNameCategory(_PluginBase):
                 media_info.set_category(final_category)
                 
                 # 在render_str开头添加子分类（原分类已在path中）
-                updated_render_str = f"{new_category}/{render_str}"
+                updated_render_str = (prefix or new_category + "/") + render_str
                 
                 # 更新事件数据
-                event.event_data.updated_str = updated_render_str
-                event.event_data.updated = True
-                event.event_data.source = "FileNameCategory"
+                self._apply_hit(data, updated_render_str)
                 
                 logger.info(f"文件名分类：匹配成功！'{original_name}' -> 规则 '{pattern}' -> 最终分类 '{final_category}'")
             else:
-                logger.debug(f"文件名分类：文件名 '{original_name}' 未匹配任何规则")
+                logger.debug(f"文件名分类：原分类 '{current_category}'，文件名 '{original_name}' "
+                             f"未匹配 {len(self._rules)} 条规则中的任何一条（{skipped} 条规则因目标路径不匹配跳过）")
 
         except Exception as e:
             logger.error(f"文件名分类异常: {str(e)}", exc_info=True)
-            if hasattr(event, 'event_data') and event.event_data:
-                event.event_data.updated = False
+            data.updated = False
+
+    @staticmethod
+    def _apply_hit(event_data, updated_str: str):
+        """
+        将匹配后的渲染路径写回事件数据
+        """
+        event_data.updated_str = updated_str
+        event_data.updated = True
+        event_data.source = _SOURCE
 
     def stop_service(self):
         """